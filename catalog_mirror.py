@@ -0,0 +1,130 @@
+# catalog_mirror.py
+
+import sqlite3
+import logging
+from threading import Lock
+
+import requests
+
+# Same sort keys the server accepts on /search
+SORT_KEYS = {
+    'popularity': 'download_count DESC, file_id',
+    'rating': 'average_rating DESC, file_id',
+    'name': 'file_name COLLATE NOCASE, file_id',
+}
+
+# Local SQLite copy of the server's file catalog, kept current through /changes
+class CatalogMirror:
+    def __init__(self, path, server_url):
+        self.path = path
+        self.server_url = server_url
+        self.lock = Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def _init_db(self):
+        with self.lock:
+            conn = self._connect()
+            c = conn.cursor()
+            c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    file_id INTEGER PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    file_size INTEGER,
+                    file_type TEXT,
+                    shared_by TEXT,
+                    average_rating REAL,
+                    rating_count INTEGER,
+                    download_count INTEGER
+                )
+            ''')
+            c.execute("CREATE INDEX IF NOT EXISTS idx_files_shared_by ON files(shared_by)")
+            c.execute("SELECT value FROM meta WHERE key = 'server_url'")
+            row = c.fetchone()
+            if row is None or row[0] != self.server_url:
+                # A mirror of a different server is useless; start over
+                c.execute("DELETE FROM files")
+                c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('server_url', ?)", (self.server_url,))
+                c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seq', '0')")
+            conn.commit()
+            conn.close()
+
+    @property
+    def seq(self):
+        with self.lock:
+            conn = self._connect()
+            c = conn.cursor()
+            c.execute("SELECT value FROM meta WHERE key = 'seq'")
+            row = c.fetchone()
+            conn.close()
+        return int(row[0]) if row else 0
+
+    def sync(self, timeout=10):
+        """Fetch changes since the last sync and apply them. Returns the new sequence number."""
+        since = self.seq
+        response = requests.get(f"{self.server_url}/changes", params={'since': since}, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        columns = data['columns']
+        rows = [tuple(row) for row in data['files']]
+
+        with self.lock:
+            conn = self._connect()
+            c = conn.cursor()
+            if data['full']:
+                c.execute("DELETE FROM files")
+            placeholders = ', '.join('?' for _ in columns)
+            c.executemany(
+                f"INSERT OR REPLACE INTO files ({', '.join(columns)}) VALUES ({placeholders})",
+                rows
+            )
+            c.execute("UPDATE meta SET value = ? WHERE key = 'seq'", (str(data['seq']),))
+            conn.commit()
+            conn.close()
+        logging.info(f"Catalog synced from seq {since} to {data['seq']} ({len(rows)} changed files).")
+        return data['seq']
+
+    def search(self, query='', file_type='', sort=''):
+        sql = """
+            SELECT file_id, file_name, file_size, file_type, shared_by,
+                   average_rating, rating_count, download_count
+            FROM files
+            WHERE file_name LIKE ?
+        """
+        params = ('%' + query + '%',)
+        if file_type:
+            sql += " AND file_type = ?"
+            params += (file_type,)
+        sql += " ORDER BY " + SORT_KEYS.get(sort, 'file_id')
+        return self._fetch(sql, params)
+
+    def files_shared_by(self, username):
+        sql = """
+            SELECT file_id, file_name, file_size, file_type, shared_by,
+                   average_rating, rating_count, download_count
+            FROM files
+            WHERE shared_by = ?
+            ORDER BY file_id
+        """
+        return self._fetch(sql, (username,))
+
+    def _fetch(self, sql, params):
+        with self.lock:
+            conn = self._connect()
+            c = conn.cursor()
+            c.execute(sql, params)
+            results = c.fetchall()
+            conn.close()
+        return [{
+            'file_id': row[0],
+            'file_name': row[1],
+            'file_size': row[2],
+            'file_type': row[3],
+            'shared_by': row[4],
+            'average_rating': row[5],
+            'rating_count': row[6],
+            'download_count': row[7]
+        } for row in results]
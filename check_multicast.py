@@ -0,0 +1,128 @@
+# check_multicast.py
+#
+# Loopback check for broadcast sessions. Starts the server on 127.0.0.1, broadcasts a file
+# to a clean receiver and to one that drops packets, repairs both over unicast and fails
+# unless both copies match, the file was counted once per receiver, unicast repair stayed
+# within REPAIR_BUDGET and every receiver finished within TIME_BUDGET of the session's wire time.
+# Run with: python check_multicast.py
+
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+import server
+from multicast import BLOCK_SIZE, FEC_GROUP, HEADER, MulticastReceiver, block_count
+
+FILE_SIZE = 20 * 1024 * 1024
+LOSS_RATE = 0.05
+# With one parity block per FEC_GROUP data blocks, 5% loss leaves about 2% of blocks to repair
+REPAIR_BUDGET = 0.03
+# Receivers must finish, repairs included, within this multiple of the time the session's packets
+# take at MULTICAST_RATE. The sender and both receivers share this machine's CPU, which on a
+# single core stretches the session to about twice its wire time.
+TIME_BUDGET = 2.5
+
+# Receiver that throws away a fraction of packets, standing in for a lossy network
+class LossyReceiver(MulticastReceiver):
+    def __init__(self, *args, loss_rate, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loss_rate = loss_rate
+        self.rng = random.Random(0)
+
+    def _recv(self):
+        while True:
+            packet = super()._recv()
+            if self.rng.random() >= self.loss_rate:
+                return packet
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        server.DATABASE = os.path.join(tmp, 'database.db')
+        server.SHARED_FILES_DIR = os.path.join(tmp, 'shared_files')
+        server.MULTICAST_INTERFACE = '127.0.0.1'
+        server.BROADCAST_START_DELAY = 1
+        os.makedirs(server.SHARED_FILES_DIR)
+        server.init_db()
+
+        data = random.Random(1).randbytes(FILE_SIZE)
+        client = server.app.test_client()
+        client.post('/register', data={'username': 'checker', 'password': 'secret'})
+        client.post('/register_file', content_type='multipart/form-data',
+                    data={'username': 'checker', 'user_id': '1', 'file': (io.BytesIO(data), 'broadcast.bin')})
+
+        http = make_server('127.0.0.1', 0, server.app, threaded=True)
+        threading.Thread(target=http.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{http.server_port}"
+
+        start = time.monotonic()
+        requests.get(f"{base_url}/download/1").raise_for_status()
+        unicast_time = time.monotonic() - start
+        server.flush_download_counts()
+        counted_before = client.get('/search').json['files'][0]['download_count']
+
+        session = client.post('/broadcast', data={'file_id': 1}).json
+        receivers = [
+            MulticastReceiver(session, os.path.join(tmp, 'clean.bin'), '127.0.0.1', idle_timeout=5),
+            LossyReceiver(session, os.path.join(tmp, 'lossy.bin'), '127.0.0.1', idle_timeout=5, loss_rate=LOSS_RATE),
+        ]
+        results = {}
+
+        receipt = {'session_id': session['session_id'], 'file_id': 1}
+
+        def run(receiver, address):
+            began = time.monotonic()
+            missing = receiver.receive()
+            repaired = receiver.repair(f"{base_url}/download/1")
+            # Both receivers share this host, so report from distinct addresses as separate hosts would
+            server.app.test_client().post('/broadcast/received', data=receipt, environ_base={'REMOTE_ADDR': address})
+            results[receiver.dest_path] = (missing, repaired, time.monotonic() - began - session['start_delay'])
+
+        threads = [threading.Thread(target=run, args=(receiver, f"127.0.0.{n + 1}"))
+                   for n, receiver in enumerate(receivers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        http.shutdown()
+
+        # Loopback unicast is not held to any link rate, so the session's own wire time is the baseline
+        blocks = block_count(FILE_SIZE)
+        parity = (blocks + FEC_GROUP - 1) // FEC_GROUP
+        wire_bytes = FILE_SIZE + parity * BLOCK_SIZE + (blocks + parity) * HEADER.size
+        baseline = wire_bytes / server.MULTICAST_RATE
+        failures = 0
+        for receiver in receivers:
+            missing, repaired, elapsed = results[receiver.dest_path]
+            with open(receiver.dest_path, 'rb') as f:
+                ok = f.read() == data
+            ok = ok and missing <= REPAIR_BUDGET * receiver.total and elapsed <= TIME_BUDGET * baseline
+            failures += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] {os.path.basename(receiver.dest_path)}: "
+                  f"{missing} of {receiver.total} blocks repaired ({missing / receiver.total:.1%}, "
+                  f"budget {REPAIR_BUDGET:.0%}) in {elapsed:.2f}s (budget {TIME_BUDGET * baseline:.2f}s)")
+
+        # Repeats and receipts for sessions that never ran must not count
+        client.post('/broadcast/received', data=receipt, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        client.post('/broadcast/received', data={'session_id': session['session_id'] ^ 1, 'file_id': 1})
+        client.post('/broadcast/received', data={'session_id': session['session_id'], 'file_id': 2})
+
+        server.flush_download_counts()
+        counted = client.get('/search').json['files'][0]['download_count'] - counted_before
+        if counted != len(receivers):
+            failures += 1
+        print(f"[{'ok' if counted == len(receivers) else 'FAIL'}] download_count rose by {counted} "
+              f"for {len(receivers)} receivers")
+        print(f"\nUnicast download took {unicast_time:.2f}s, {len(receivers) * unicast_time:.2f}s for "
+              f"{len(receivers)} receivers; broadcast sends at {server.MULTICAST_RATE / (1024 * 1024):.0f} MiB/s "
+              f"and reached all of them in {max(result[2] for result in results.values()):.2f}s.")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
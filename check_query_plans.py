@@ -0,0 +1,160 @@
+# check_query_plans.py
+#
+# Query-plan regression check. Seeds a large temporary database, drives every server
+# endpoint that touches SQLite, records the SQL they run and fails if EXPLAIN QUERY PLAN
+# shows any of it scanning a whole table. Run with: python check_query_plans.py
+
+import io
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from unittest import mock
+
+import server
+
+SEED_USERS = 2000
+SEED_FILES = 100000
+SEED_RATINGS = 200000
+FILE_TYPES = ['pdf', 'txt', 'ppt', 'py', 'zip', 'png', 'docx', 'mp4']
+
+# Requests allowed to scan files, and why
+ALLOWED_SCANS = {
+    'search everything': "lists the whole catalog",
+    'search everything by popularity': "lists the whole catalog",
+    'changes full snapshot': "lists the whole catalog",
+    'search by short name': "no three-character run for the trigram index to use",
+    'search by wildcard name': "no three-character run for the trigram index to use",
+}
+
+SCAN = re.compile(r'^SCAN (?:main\.)?(\w+)(?: |$)')
+# FTS5 reports every trigram LIKE the same way, so check the pattern itself
+TRIGRAM_LIKE = re.compile(r"files_name_fts WHERE file_name LIKE '((?:[^']|'')*)'")
+
+def seed(path):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.executemany("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                  ((f"user{i}", b'x') for i in range(SEED_USERS)))
+    rng = random.Random(0)
+    c.executemany("""
+        INSERT INTO files (file_name, file_size, file_type, shared_by, download_count, change_seq)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, ((f"file_{i}_{rng.choice(['lab', 'notes', 'slides', 'handout'])}.{file_type}",
+           rng.randint(1, 10 ** 7), file_type, rng.randint(1, SEED_USERS), rng.randint(0, 500), i + 1)
+          for i, file_type in ((i, rng.choice(FILE_TYPES)) for i in range(SEED_FILES))))
+    pairs = set()
+    while len(pairs) < SEED_RATINGS:
+        pairs.add((rng.randint(1, SEED_FILES), rng.randint(1, SEED_USERS)))
+    c.executemany("INSERT INTO ratings (file_id, user_id, rating, change_seq) VALUES (?, ?, ?, ?)",
+                  ((file_id, user_id, rng.randint(1, 5), SEED_FILES + n + 1)
+                   for n, (file_id, user_id) in enumerate(pairs)))
+    conn.commit()
+    conn.close()
+
+def exercise(client):
+    """Yield a label before each request so the SQL it runs can be attributed."""
+    yield 'register'
+    client.post('/register', data={'username': 'checker', 'password': 'secret'})
+    yield 'login'
+    client.post('/login', data={'username': 'checker', 'password': 'secret'})
+    yield 'register file'
+    client.post('/register_file', content_type='multipart/form-data',
+                data={'username': 'checker', 'user_id': '1', 'file': (io.BytesIO(b'plan'), 'plan_check.txt')})
+    yield 'search by name'
+    client.get('/search', query_string={'query': 'handout'})
+    yield 'search by short name'
+    client.get('/search', query_string={'query': 'ab'})
+    yield 'search by wildcard name'
+    client.get('/search', query_string={'query': '_1'})
+    yield 'search by type'
+    client.get('/search', query_string={'type': 'pdf'})
+    yield 'search by name and type'
+    client.get('/search', query_string={'query': 'slides', 'type': 'ppt', 'sort': 'rating'})
+    yield 'search everything'
+    client.get('/search')
+    yield 'search everything by popularity'
+    client.get('/search', query_string={'sort': 'popularity'})
+    yield 'download'
+    client.get(f'/download/{SEED_FILES + 1}')
+    yield 'download missing file'
+    client.get(f'/download/{SEED_FILES * 10}')
+    yield 'flush download counts'
+    server.flush_download_counts()
+    yield 'rate file'
+    client.post('/rate_file', data={'file_id': '42', 'user_id': '1', 'rating': '4'})
+    yield 'changes since'
+    client.get('/changes', query_string={'since': SEED_FILES + SEED_RATINGS - 10})
+    yield 'changes full snapshot'
+    client.get('/changes', query_string={'since': 0})
+    yield 'broadcast missing file'
+    client.post('/broadcast', data={'file_id': SEED_FILES * 10})
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'database.db')
+        server.DATABASE = db_path
+        server.SHARED_FILES_DIR = os.path.join(tmp, 'shared_files')
+        os.makedirs(server.SHARED_FILES_DIR)
+        server.init_db()
+        seed(db_path)
+
+        statements = []  # (label, sql)
+        current = ['setup']
+        connect = sqlite3.connect
+
+        def tracing_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(lambda sql: statements.append((current[0], sql)))
+            return conn
+
+        client = server.app.test_client()
+        with mock.patch.object(sqlite3, 'connect', tracing_connect):
+            for label in exercise(client):
+                current[0] = label
+
+        conn = connect(db_path)
+        # Internal statements of virtual table modules (e.g. FTS5 reading its config) are not ours to index
+        virtual_tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE sql LIKE 'CREATE VIRTUAL TABLE%'")]
+
+        def is_full_scan(label, step):
+            match = SCAN.match(step)
+            if not match or 'VIRTUAL TABLE' in step:
+                return False
+            table = match.group(1)
+            if table == 'CONSTANT' or any(table.startswith(name + '_') for name in virtual_tables):
+                return False
+            return not (label in ALLOWED_SCANS and table == 'f')
+
+        def short_trigram_patterns(sql):
+            # A pattern without three consecutive non-wildcard characters makes FTS5 scan its whole index
+            return [pattern for pattern in TRIGRAM_LIKE.findall(sql) if not server.TRIGRAM_SEARCHABLE.search(pattern)]
+
+        failures = 0
+        seen = set()
+        for label, sql in statements:
+            if not re.match(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', sql, re.IGNORECASE) or sql in seen:
+                continue
+            seen.add(sql)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            scans = [step for step in plan if is_full_scan(label, step)]
+            scans += [f"trigram LIKE '{pattern}' scans the whole index" for pattern in short_trigram_patterns(sql)]
+            status = 'FAIL' if scans else 'ok'
+            failures += bool(scans)
+            print(f"[{status}] {label}: {' '.join(sql.split())[:120]}")
+            for step in plan:
+                print(f"        {step}")
+            for reason in scans:
+                print(f"        -> {reason}")
+            if not scans and label in ALLOWED_SCANS:
+                print(f"        (scan allowed: {ALLOWED_SCANS[label]})")
+        conn.close()
+
+    print(f"\n{len(seen)} statements checked, {failures} with full table scans.")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,7 @@ import os
 import logging
 from datetime import datetime
 import queue
+from catalog_mirror import CatalogMirror
 
 # Configure logging
 logging.basicConfig(
@@ -18,16 +19,27 @@ logging.basicConfig(
 # Server Configuration
 DEFAULT_SERVER_URL = 'http://10.35.13.164:5000'  # Update as needed
 
+# Search sort options shown to the user, mapped to the server's sort keys
+SEARCH_SORT_OPTIONS = {
+    'Default': '',
+    'Most Downloaded': 'popularity',
+    'Highest Rated': 'rating',
+    'Name': 'name',
+}
+
 # Directories
 DOWNLOAD_DIR = os.path.abspath('downloads')
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+# Local copy of the server's catalog, searchable offline
+CATALOG_MIRROR_DB = os.path.abspath('catalog_mirror.db')
+
 # Initialize SocketIO client
 sio = socketio.Client()
 chat_queue = queue.Queue()
 
 # Session state initialization
-for key in ['logged_in', 'user_id', 'username', 'chat_messages', 'connected', 'current_page', 'update_chat_started', 'server_url']:
+for key in ['logged_in', 'user_id', 'username', 'chat_messages', 'connected', 'current_page', 'update_chat_started', 'server_url', 'catalog_mirror']:
     if key not in st.session_state:
         if key == 'server_url':
             st.session_state[key] = DEFAULT_SERVER_URL
@@ -80,6 +92,21 @@ def disconnect_socketio(username):
     except Exception as e:
         logging.error(f"Failed to disconnect from chat server: {e}")
 
+def refresh_catalog(server_url):
+    """Bring the local catalog mirror up to date. Returns False if the server could not be reached."""
+    mirror = st.session_state.catalog_mirror
+    if mirror is None or mirror.server_url != server_url:
+        mirror = CatalogMirror(CATALOG_MIRROR_DB, server_url)
+        st.session_state.catalog_mirror = mirror
+    # Sync on every render: /changes returns only the rows changed since the mirror's seq,
+    # and pushed events can be missed while the socket is down or across Streamlit reruns
+    try:
+        mirror.sync()
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Catalog sync failed: {e}")
+        return False
+    return True
+
 def update_chat():
     while True:
         while not chat_queue.empty():
@@ -370,46 +397,31 @@ def search_files_page(server_url):
     with st.form("search_form"):
         query = st.text_input("File Name")
         file_type = st.text_input("File Type")
+        sort_label = st.selectbox("Sort By", list(SEARCH_SORT_OPTIONS))
         submit = st.form_submit_button("Search")
     if submit:
-        try:
-            params = {'query': query, 'type': file_type}
-            response = requests.get(f"{server_url}/search", params=params)
-            if response.status_code == 200:
-                files = response.json().get('files', [])
-                if files:
-                    for file in files:
-                        display_file_info(file, server_url)
-                else:
-                    st.info("No files found.")
-            else:
-                st.error("Search failed.")
-        except requests.exceptions.RequestException as e:
-            st.error(f"Connection error: {e}")
+        if not refresh_catalog(server_url):
+            st.warning("Server unreachable. Showing results from the cached catalog.")
+        files = st.session_state.catalog_mirror.search(query, file_type, SEARCH_SORT_OPTIONS[sort_label])
+        if files:
+            for file in files:
+                display_file_info(file, server_url)
+        else:
+            st.info("No files found.")
 
 def my_shared_files_page(server_url):
     st.subheader("My Shared Files")
     st.write("Manage the files you've shared.")
-    try:
-        params = {'query': '', 'type': ''}
-        response = requests.get(f"{server_url}/search", params=params)
-        if response.status_code == 200:
-            files = response.json().get('files', [])
-            my_files = [
-                file for file in files
-                if file['shared_by'] == st.session_state.username
-            ]
-            if my_files:
-                for index, file in enumerate(my_files):
-                    display_file_info(file, server_url, show_rating=False, index=index)
-            else:
-                st.info("You haven't shared any files yet.")
-        else:
-            st.error("Failed to retrieve your files.")
-    except requests.exceptions.RequestException as e:
-        st.error(f"Connection error: {e}")
+    if not refresh_catalog(server_url):
+        st.warning("Server unreachable. Showing your files from the cached catalog.")
+    my_files = st.session_state.catalog_mirror.files_shared_by(st.session_state.username)
+    if my_files:
+        for file in my_files:
+            display_file_info(file, server_url, show_rating=False)
+    else:
+        st.info("You haven't shared any files yet.")
 
-def display_file_info(file, server_url, show_rating=False, index=None):
+def display_file_info(file, server_url, show_rating=False):
     with st.container():
         col1, col2 = st.columns([4, 1])
         with col1:
@@ -417,26 +429,11 @@ def display_file_info(file, server_url, show_rating=False, index=None):
             st.markdown(f"**Size:** {file['file_size']} bytes")
             st.markdown(f"**Type:** {file['file_type']}")
             st.markdown(f"**Shared by:** {file['shared_by']}")
+            st.markdown(f"**Downloads:** {file.get('download_count', 0)}")
         with col2:
+            # Link to the file instead of prefetching it, so bytes only move when the user downloads
             download_url = f"{server_url}/download/{file['file_id']}"
-            try:
-                file_response = requests.get(download_url)
-                if file_response.status_code == 200:
-                    # Use index to ensure unique key
-                    if index is not None:
-                        key = f"download_{file['file_id']}_{index}"
-                    else:
-                        key = f"download_{file['file_id']}_{file['file_name']}"
-                    st.download_button(
-                        label="Download",
-                        data=file_response.content,
-                        file_name=file['file_name'],
-                        key=key  # Unique key
-                    )
-                else:
-                    st.error("Failed to download file.")
-            except requests.exceptions.RequestException as e:
-                st.error(f"Connection error: {e}")
+            st.link_button("Download", download_url)
         st.markdown("---")
 
 def chat_page():
@@ -0,0 +1,131 @@
+# log_pipeline.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Handler that puts records on a queue without formatting them
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0  # records dropped on a full queue since the last one queued
+
+    def prepare(self, record):
+        # The record never leaves the process, so message formatting can wait for the listener thread
+        return record
+
+    def enqueue(self, record):
+        # Handler.handle holds self.lock around emit, so self.dropped needs no lock of its own
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            record.dropped = dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                # Never lose warnings or errors; wait for the writer to catch up
+                self.queue.put(record)
+            else:
+                self.dropped += dropped + 1
+
+# Drops a fraction of records for hot events, and caps how many are written per second
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.buckets = {}     # event -> (tokens, last refill time)
+        self.suppressed = {}  # event -> records dropped since the last one written
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None or record.levelno >= logging.ERROR:
+            return True
+
+        rate = self.sample_rates.get(event, 1.0)
+        keep = rate >= 1.0 or random.random() < rate
+        limit = self.rate_limits.get(event)
+        with self.lock:
+            if keep and limit is not None:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(event, (limit, now))
+                tokens = min(limit, tokens + (now - last) * limit)
+                keep = tokens >= 1
+                self.buckets[event] = (tokens - 1 if keep else tokens, now)
+            if not keep:
+                self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                return False
+            record.suppressed = self.suppressed.pop(event, 0)
+        return True
+
+# Stamps each record with the id of the request that produced it
+class RequestIdFilter(logging.Filter):
+    def __init__(self, get_request_id):
+        super().__init__()
+        self.get_request_id = get_request_id
+
+    def filter(self, record):
+        record.request_id = self.get_request_id() or '-'
+        return True
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" ({suppressed} similar records suppressed)"
+        dropped = getattr(record, 'dropped', 0)
+        if dropped:
+            line += f" ({dropped} records dropped while the log queue was full)"
+        return line
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def setup_logging(level=logging.INFO, json_output=False, sample_rates=None, rate_limits=None,
+                  get_request_id=None, queue_size=10000):
+    """Route root logging through a queue drained by a background writer thread."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_output else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates, rate_limits))
+    # Always set, since the text format includes it
+    queue_handler.addFilter(RequestIdFilter(get_request_id or (lambda: None)))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,152 @@
+# migrations.py
+
+import logging
+import sqlite3
+
+# Each migration upgrades the schema by one version. Applied versions are recorded in
+# PRAGMA user_version, and every migration runs inside its own transaction.
+
+TRIGRAM_MIN_SQLITE = (3, 34, 0)  # First release with the FTS5 trigram tokenizer
+
+def add_column(c, table, column, definition):
+    # Databases created between releases may already have the column
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def create_base_tables(c):
+    # Users table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Files table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS files (
+            file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name TEXT NOT NULL,
+            file_size INTEGER,
+            file_type TEXT,
+            shared_by INTEGER,
+            upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(shared_by) REFERENCES users(user_id)
+        )
+    ''')
+    # Ratings table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ratings (
+            rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL CHECK(rating BETWEEN 1 AND 5),
+            rating_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(file_id) REFERENCES files(file_id),
+            FOREIGN KEY(user_id) REFERENCES users(user_id),
+            UNIQUE(file_id, user_id)
+        )
+    ''')
+
+def add_download_counts(c):
+    add_column(c, 'files', 'download_count', 'INTEGER NOT NULL DEFAULT 0')
+
+def add_change_sequence(c):
+    add_column(c, 'files', 'change_seq', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(c, 'ratings', 'change_seq', 'INTEGER NOT NULL DEFAULT 0')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_change_seq ON files(change_seq)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ratings_change_seq ON ratings(change_seq)")
+
+def add_lookup_indexes(c):
+    # ratings(file_id) is already served by the UNIQUE(file_id, user_id) index
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_file_type ON files(file_type)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_files_shared_by ON files(shared_by)")
+
+def trigram_supported(c):
+    """Whether this SQLite build has FTS5 and the trigram tokenizer."""
+    if sqlite3.sqlite_version_info < TRIGRAM_MIN_SQLITE:
+        return False
+    return 'ENABLE_FTS5' in [row[0] for row in c.execute("PRAGMA compile_options")]
+
+def has_file_name_index(c):
+    return c.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_name_fts'").fetchone() is not None
+
+def add_file_name_index(c):
+    # Substring searches (LIKE '%q%') cannot use a B-tree index; a trigram index can
+    if not trigram_supported(c):
+        logging.warning(f"SQLite {sqlite3.sqlite_version} lacks FTS5 or its trigram tokenizer "
+                        f"(needs {'.'.join(map(str, TRIGRAM_MIN_SQLITE))} or newer built with FTS5); "
+                        f"file name search will scan the files table.")
+        return
+    create_file_name_index(c)
+
+def create_file_name_index(c):
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS files_name_fts
+        USING fts5(file_name, content='files', content_rowid='file_id', tokenize='trigram')
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_name_fts_insert AFTER INSERT ON files BEGIN
+            INSERT INTO files_name_fts (rowid, file_name) VALUES (new.file_id, new.file_name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_name_fts_delete AFTER DELETE ON files BEGIN
+            INSERT INTO files_name_fts (files_name_fts, rowid, file_name) VALUES ('delete', old.file_id, old.file_name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS files_name_fts_update AFTER UPDATE OF file_name ON files BEGIN
+            INSERT INTO files_name_fts (files_name_fts, rowid, file_name) VALUES ('delete', old.file_id, old.file_name);
+            INSERT INTO files_name_fts (rowid, file_name) VALUES (new.file_id, new.file_name);
+        END
+    ''')
+    c.execute("INSERT INTO files_name_fts (files_name_fts) VALUES ('rebuild')")
+
+# Append new migrations at the end; never edit or reorder released ones
+MIGRATIONS = [
+    (1, "users, files and ratings tables", create_base_tables),
+    (2, "files.download_count", add_download_counts),
+    (3, "change sequence on files and ratings", add_change_sequence),
+    (4, "indexes on files(file_type) and files(shared_by)", add_lookup_indexes),
+    (5, "trigram index on files(file_name)", add_file_name_index),
+]
+
+def migrate(conn):
+    """Bring the database up to the latest schema version. Returns the resulting version."""
+    # Manage transactions explicitly so DDL and the version bump commit together
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        c = conn.cursor()
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for target, description, apply in MIGRATIONS:
+            if target <= version:
+                continue
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                apply(c)
+                c.execute(f"PRAGMA user_version = {target}")
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                logging.error(f"Database migration {target} ({description}) failed; rolled back.")
+                raise
+            version = target
+            logging.info(f"Applied database migration {target}: {description}.")
+        if version >= 5 and not has_file_name_index(c) and trigram_supported(c):
+            # Migration 5 ran on a SQLite without trigram support; the library has since been upgraded
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                create_file_name_index(c)
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                logging.error("Creating the trigram index on files(file_name) failed; rolled back.")
+                raise
+            logging.info("Created the trigram index on files(file_name) skipped by migration 5.")
+        return version
+    finally:
+        conn.isolation_level = isolation_level
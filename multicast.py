@@ -0,0 +1,220 @@
+# multicast.py
+
+import logging
+import os
+import socket
+import struct
+import time
+
+import requests
+
+# Packet header: magic, kind, session id, index, total data blocks, payload length
+HEADER = struct.Struct('!4sBIIIH')
+MAGIC = b'P2PM'
+KIND_DATA = 0
+KIND_PARITY = 1
+KIND_END = 2
+
+BLOCK_SIZE = 1400  # Header + payload stays under a 1500-byte Ethernet MTU
+FEC_GROUP = 8      # One XOR parity block per this many data blocks
+END_REPEAT = 3     # End-of-session packets are repeated in case some are lost
+REPAIR_BATCH = 64  # Byte ranges asked for per repair request
+
+def xor_blocks(blocks):
+    """XOR byte strings together, padding each to BLOCK_SIZE."""
+    acc = 0
+    for block in blocks:
+        acc ^= int.from_bytes(block.ljust(BLOCK_SIZE, b'\0'), 'big')
+    return acc.to_bytes(BLOCK_SIZE, 'big')
+
+def byterange_parts(response):
+    """Yield (start, data) for each range in a 206 response, single or multipart/byteranges."""
+    content_type = response.headers.get('Content-Type', '')
+    if not content_type.startswith('multipart/byteranges'):
+        start = int(response.headers['Content-Range'].split()[1].split('-')[0])
+        yield start, response.content
+        return
+    delimiter = b'--' + content_type.split('boundary=')[1].strip('"').encode()
+    body = response.content
+    position = body.index(delimiter)
+    while not body.startswith(b'--', position + len(delimiter)):
+        head_end = body.index(b'\r\n\r\n', position)
+        head = body[position:head_end].decode('latin-1')
+        content_range = next(line for line in head.split('\r\n') if line.lower().startswith('content-range:'))
+        start, end = map(int, content_range.split()[2].split('/')[0].split('-'))
+        data_start = head_end + 4
+        yield start, body[data_start:data_start + end - start + 1]
+        position = body.index(delimiter, data_start + end - start + 1)
+
+def block_count(file_size):
+    return (file_size + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+def block_length(index, file_size):
+    return min(BLOCK_SIZE, file_size - index * BLOCK_SIZE)
+
+# Sends one file to a multicast group at a paced rate, with parity blocks for loss recovery
+class MulticastSender:
+    def __init__(self, session_id, file_path, group, port, interface='0.0.0.0', ttl=1, rate=100 * 1024 * 1024):
+        self.session_id = session_id
+        self.file_path = file_path
+        self.group = group
+        self.port = port
+        self.rate = rate  # bytes per second
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+    def send(self):
+        file_size = os.path.getsize(self.file_path)
+        total = block_count(file_size)
+        start = time.monotonic()
+        sent_bytes = 0
+        group_blocks = []
+        with open(self.file_path, 'rb') as f:
+            for index in range(total):
+                block = f.read(BLOCK_SIZE)
+                sent_bytes += self._send_packet(KIND_DATA, index, total, block)
+                group_blocks.append(block)
+                if len(group_blocks) == FEC_GROUP or index == total - 1:
+                    sent_bytes += self._send_packet(KIND_PARITY, index // FEC_GROUP, total, xor_blocks(group_blocks))
+                    group_blocks = []
+                # Pace to the configured rate so receivers' socket buffers do not overflow
+                ahead = sent_bytes / self.rate - (time.monotonic() - start)
+                if ahead > 0.001:
+                    time.sleep(ahead)
+        for _ in range(END_REPEAT):
+            self._send_packet(KIND_END, 0, total, b'')
+            time.sleep(0.01)
+        self.sock.close()
+        elapsed = time.monotonic() - start
+        logging.info(f"Multicast session {self.session_id} sent {total} blocks of '{self.file_path}' in {elapsed:.2f}s.")
+        return elapsed
+
+    def _send_packet(self, kind, index, total, payload):
+        packet = HEADER.pack(MAGIC, kind, self.session_id, index, total, len(payload)) + payload
+        self.sock.sendto(packet, (self.group, self.port))
+        return len(packet)
+
+# Receives a multicast session into a file, recovering single losses per group from parity
+class MulticastReceiver:
+    def __init__(self, session, dest_path, interface='0.0.0.0', idle_timeout=5.0):
+        self.session = session
+        self.dest_path = dest_path
+        self.file_size = session['file_size']
+        self.total = block_count(self.file_size)
+        self.received = bytearray(self.total)  # 1 where the block has been written
+        # Payloads of the group being received, kept so parity recovery does not read the file back
+        self.group = None
+        self.group_blocks = []
+        self.offset = None  # file position after the last write, to skip seeks for in-order blocks
+        self.idle_timeout = idle_timeout
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(('', session['port']))
+        membership = socket.inet_aton(session['group']) + socket.inet_aton(interface)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.sock.settimeout(idle_timeout)
+
+    def receive(self):
+        """Receive until the session ends or goes quiet. Returns the number of missing blocks."""
+        with open(self.dest_path, 'wb') as f:
+            f.truncate(self.file_size)
+        with open(self.dest_path, 'r+b') as f:
+            while True:
+                try:
+                    packet = self._recv()
+                except socket.timeout:
+                    logging.warning(f"Multicast session {self.session['session_id']} went quiet.")
+                    break
+                if len(packet) < HEADER.size:
+                    continue
+                magic, kind, session_id, index, total, length = HEADER.unpack_from(packet)
+                if magic != MAGIC or session_id != self.session['session_id'] or total != self.total:
+                    continue
+                payload = packet[HEADER.size:HEADER.size + length]
+                if kind == KIND_END:
+                    break
+                if kind == KIND_DATA and index < self.total and not self.received[index]:
+                    self._write_block(f, index, payload)
+                elif kind == KIND_PARITY:
+                    self._recover(f, index, payload)
+        self.sock.close()
+        return self.total - sum(self.received)
+
+    def _recv(self):
+        return self.sock.recv(HEADER.size + BLOCK_SIZE)
+
+    def _write_block(self, f, index, payload):
+        payload = payload[:block_length(index, self.file_size)]
+        offset = index * BLOCK_SIZE
+        if offset != self.offset:
+            # Seeking flushes the write buffer, so only do it when blocks arrive out of order
+            f.seek(offset)
+        f.write(payload)
+        self.offset = offset + len(payload)
+        self.received[index] = 1
+        if index // FEC_GROUP != self.group:
+            # Packets arrive in order, so a new group means the previous parity was lost
+            self.group = index // FEC_GROUP
+            self.group_blocks = []
+        self.group_blocks.append(payload)
+
+    def _recover(self, f, group, parity):
+        first = group * FEC_GROUP
+        indices = range(first, min(first + FEC_GROUP, self.total))
+        missing = [index for index in indices if not self.received[index]]
+        if len(missing) != 1:
+            # Nothing to do, or too many losses for one parity block; unicast repair handles the rest
+            return
+        if group == self.group:
+            blocks = self.group_blocks
+        else:
+            # Parity arrived out of order; fall back to reading the group back from the file
+            blocks = []
+            for index in indices:
+                if index != missing[0]:
+                    f.seek(index * BLOCK_SIZE)
+                    blocks.append(f.read(block_length(index, self.file_size)))
+            self.offset = None
+        self._write_block(f, missing[0], xor_blocks([parity] + blocks))
+
+    def missing_ranges(self):
+        """Byte ranges (inclusive) of blocks that never arrived, merged where contiguous."""
+        ranges = []
+        for index in range(self.total):
+            if self.received[index]:
+                continue
+            start = index * BLOCK_SIZE
+            end = start + block_length(index, self.file_size) - 1
+            if ranges and ranges[-1][1] == start - 1:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    def repair(self, download_url, timeout=30):
+        """Fetch missing blocks over unicast with HTTP Range requests. Returns bytes fetched.
+
+        Losses are scattered, so ranges are asked for REPAIR_BATCH at a time rather than one
+        request each. The server does not count Range requests as downloads, so repairs leave
+        popularity alone.
+        """
+        fetched = 0
+        session = requests.Session()
+        ranges = self.missing_ranges()
+        with open(self.dest_path, 'r+b') as f:
+            for batch in (ranges[i:i + REPAIR_BATCH] for i in range(0, len(ranges), REPAIR_BATCH)):
+                spec = ','.join(f'{start}-{end}' for start, end in batch)
+                response = session.get(download_url, headers={'Range': f'bytes={spec}'}, timeout=timeout)
+                if response.status_code != 206:
+                    raise RuntimeError(f"Range repair of bytes {batch[0][0]}-{batch[-1][1]} "
+                                       f"failed with HTTP {response.status_code}.")
+                for start, data in byterange_parts(response):
+                    f.seek(start)
+                    f.write(data)
+                    fetched += len(data)
+        for index in range(self.total):
+            self.received[index] = 1
+        return fetched
@@ -0,0 +1,422 @@
+# p2p_cli.py
+
+import argparse
+import getpass
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+import socketio
+
+from catalog_mirror import CatalogMirror
+from multicast import MulticastReceiver
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_SERVER_URL = 'http://10.35.13.164:5000'  # Update as needed
+DEFAULT_CATALOG_DB = os.path.expanduser('~/.p2p_catalog.db')
+
+CHUNK_SIZE = 1024 * 1024
+RETRY_BACKOFF_MAX = 30  # seconds
+
+# One HTTP session per worker thread so connections are reused across transfers
+_local = threading.local()
+
+def get_session():
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+class RetryableError(Exception):
+    pass
+
+# File-like multipart/form-data body that reads the file from disk as it is sent
+class MultipartStream:
+    def __init__(self, fields, file_field, file_path):
+        self.boundary = uuid.uuid4().hex
+        head = b''
+        for name, value in fields.items():
+            head += (f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                     f'{value}\r\n').encode('utf-8')
+        file_name = os.path.basename(file_path).replace('"', '%22')
+        head += (f'--{self.boundary}\r\n'
+                 f'Content-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+        self.parts = [head, None, f'\r\n--{self.boundary}--\r\n'.encode('utf-8')]
+        self.file_path = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.length = len(head) + self.file_size + len(self.parts[2])
+        self.file = None
+        self.index = 0
+        self.offset = 0
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        out = b''
+        while len(out) < size and self.index < len(self.parts):
+            part = self.parts[self.index]
+            if part is None:
+                if self.file is None:
+                    self.file = open(self.file_path, 'rb')
+                chunk = self.file.read(size - len(out))
+                if not chunk:
+                    self.file.close()
+                    self.index += 1
+                    continue
+                out += chunk
+            else:
+                chunk = part[self.offset:self.offset + size - len(out)]
+                out += chunk
+                self.offset += len(chunk)
+                if self.offset >= len(part):
+                    self.index += 1
+                    self.offset = 0
+        return out
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def with_retries(func, retries, description):
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout, RetryableError) as e:
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = min(2 ** (attempt - 1), RETRY_BACKOFF_MAX)
+            logging.warning(f"{description} failed ({e}); retry {attempt}/{retries} in {delay}s.")
+            time.sleep(delay)
+
+def check_response(response):
+    if response.status_code >= 500 or response.status_code == 429:
+        raise RetryableError(f"HTTP {response.status_code}")
+    if response.status_code >= 400:
+        try:
+            message = response.json().get('message', '')
+        except ValueError:
+            message = response.text
+        raise RuntimeError(f"HTTP {response.status_code}: {message}")
+
+def upload_file(args, user_id, path):
+    def attempt():
+        body = MultipartStream({'username': args.username, 'user_id': user_id}, 'file', path)
+        try:
+            response = get_session().post(
+                f"{args.server}/register_file",
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=args.timeout
+            )
+        finally:
+            body.close()
+        check_response(response)
+        return body.file_size
+
+    return with_retries(attempt, args.retries, f"Upload of '{path}'")
+
+def discard_partial(part_path, validator_path):
+    for path in (part_path, validator_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def download_file(args, file, final_path):
+    part_path = final_path + '.part'
+    # ETag (or Last-Modified) of the copy the .part file came from, sent as If-Range on resume
+    validator_path = part_path + '.validator'
+    if os.path.exists(final_path) and os.path.getsize(final_path) == file['file_size']:
+        logging.info(f"Skipping '{final_path}', already complete.")
+        return 0
+
+    def attempt():
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {}
+        if offset and os.path.exists(validator_path):
+            with open(validator_path) as f:
+                validator = f.read()
+            # If the file was replaced since, the server ignores the Range and sends the new copy whole
+            headers = {'Range': f'bytes={offset}-', 'If-Range': validator}
+        with get_session().get(f"{args.server}/download/{file['file_id']}",
+                               headers=headers, stream=True, timeout=args.timeout) as response:
+            if response.status_code == 416:
+                if offset == file['file_size']:
+                    # Everything arrived last time, only the rename was missed
+                    os.replace(part_path, final_path)
+                    discard_partial(part_path, validator_path)
+                    return 0
+                # Partial file does not match the server's copy; start over
+                discard_partial(part_path, validator_path)
+                raise RetryableError("stale partial download")
+            check_response(response)
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            if mode == 'wb':
+                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                if validator:
+                    with open(validator_path, 'w') as f:
+                        f.write(validator)
+                elif os.path.exists(validator_path):
+                    os.remove(validator_path)
+            received = 0
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    received += len(chunk)
+        size = os.path.getsize(part_path)
+        if size > file['file_size']:
+            # The server's copy changed under us; start over
+            discard_partial(part_path, validator_path)
+            raise RetryableError(f"got {size} bytes, expected {file['file_size']}")
+        if size < file['file_size']:
+            # Keep the partial file so the retry resumes from where the body stopped
+            raise RetryableError(f"body ended after {size} of {file['file_size']} bytes")
+        os.replace(part_path, final_path)
+        discard_partial(part_path, validator_path)
+        return received
+
+    return with_retries(attempt, args.retries, f"Download of '{file['file_name']}'")
+
+def run_transfers(jobs, workers, rejected=()):
+    """Run (label, callable) jobs on a bounded pool and print a summary. Returns the exit code.
+
+    rejected holds (label, reason) pairs that were refused before queuing; they count as failures.
+    """
+    start = time.monotonic()
+    total_bytes = 0
+    done = 0
+    failures = list(rejected)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(func): label for label, func in jobs}
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                size = future.result()
+                total_bytes += size
+                done += 1
+                logging.info(f"Done: {label} ({size} bytes).")
+            except Exception as e:
+                failures.append((label, e))
+                logging.error(f"Failed: {label}: {e}")
+    elapsed = time.monotonic() - start
+    throughput = total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else 0
+    print(f"\n{done} succeeded, {len(failures)} failed, {total_bytes} bytes in {elapsed:.1f}s ({throughput:.2f} MiB/s)")
+    for label, error in failures:
+        print(f"  FAILED {label}: {error}")
+    return 1 if failures else 0
+
+def login(args):
+    if not args.username:
+        sys.exit("--username is required for this command.")
+    password = args.password or os.environ.get('P2P_PASSWORD') or getpass.getpass()
+    response = requests.post(f"{args.server}/login",
+                             data={'username': args.username, 'password': password},
+                             timeout=args.timeout)
+    if response.status_code != 200:
+        sys.exit(f"Login failed: {response.json().get('message', response.status_code)}")
+    return response.json()['user_id']
+
+def synced_catalog(args):
+    catalog = CatalogMirror(args.catalog, args.server)
+    try:
+        catalog.sync(timeout=args.timeout)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Catalog sync failed, using cached catalog: {e}")
+    return catalog
+
+def collect_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    yield os.path.join(root, name)
+        elif os.path.isfile(path):
+            yield path
+        else:
+            logging.warning(f"Skipping '{path}', not a file or directory.")
+
+def cmd_share(args):
+    user_id = login(args)
+    # The server keeps only the base name, so two paths with the same one would overwrite each other
+    by_name = {}
+    for path in dict.fromkeys(os.path.realpath(path) for path in collect_paths(args.paths)):
+        by_name.setdefault(os.path.basename(path), []).append(path)
+    jobs = []
+    rejected = []
+    for name, paths in by_name.items():
+        if len(paths) > 1:
+            for path in paths:
+                rejected.append((f"share {path}", f"{len(paths)} files in this batch are named '{name}'"))
+                logging.error(f"Not sharing '{path}': {len(paths)} files in this batch are named '{name}'.")
+        else:
+            jobs.append((f"share {paths[0]}", lambda path=paths[0]: upload_file(args, user_id, path)))
+    return run_transfers(jobs, args.jobs, rejected)
+
+def cmd_search(args):
+    files = synced_catalog(args).search(args.query, args.type, args.sort)
+    for file in files:
+        print(f"{file['file_id']:>6}  {file['file_size']:>12}  {file['average_rating']:>4.1f}  "
+              f"{file['download_count']:>6}  {file['shared_by']:<16}  {file['file_name']}")
+    print(f"{len(files)} files.")
+    return 0
+
+def local_names(files):
+    """Map file_id to a destination name, adding the id to names shared by several files."""
+    counts = {}
+    for file in files:
+        name = os.path.basename(file['file_name'])
+        counts[name] = counts.get(name, 0) + 1
+    names = {}
+    for file in files:
+        name = os.path.basename(file['file_name'])
+        if counts[name] > 1:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem} ({file['file_id']}){ext}"
+        names[file['file_id']] = name
+    return names
+
+def get_files(args, files):
+    os.makedirs(args.dest, exist_ok=True)
+    names = local_names(files)
+    jobs = [(f"get {file['file_id']} {file['file_name']}",
+             lambda file=file: download_file(args, file, os.path.join(args.dest, names[file['file_id']])))
+            for file in files]
+    return run_transfers(jobs, args.jobs)
+
+def cmd_get(args):
+    catalog = synced_catalog(args)
+    known = {file['file_id']: file for file in catalog.search()}
+    ids = list(dict.fromkeys(args.ids))
+    missing = [file_id for file_id in ids if file_id not in known]
+    for file_id in missing:
+        logging.error(f"No file with id {file_id} in the catalog.")
+    status = get_files(args, [known[file_id] for file_id in ids if file_id in known])
+    return 1 if missing else status
+
+def cmd_mirror(args):
+    files = synced_catalog(args).search(args.query, args.type)
+    return get_files(args, files)
+
+def cmd_broadcast(args):
+    response = requests.post(f"{args.server}/broadcast", data={'file_id': args.file_id}, timeout=args.timeout)
+    if response.status_code != 201:
+        sys.exit(f"Broadcast failed: {response.json().get('message', response.status_code)}")
+    session = response.json()
+    print(f"Broadcast session {session['session_id']} for '{session['file_name']}' "
+          f"starts in {session['start_delay']}s on {session['group']}:{session['port']}.")
+    return 0
+
+def wait_for_session(args):
+    """Return a running broadcast session, waiting for an announcement if none is active."""
+    def matches(session):
+        return args.file_id is None or session['file_id'] == args.file_id
+
+    response = requests.get(f"{args.server}/broadcast", timeout=args.timeout)
+    response.raise_for_status()
+    for session in response.json()['sessions']:
+        if matches(session):
+            return session
+
+    announced = queue.Queue()
+    sio = socketio.Client()
+    sio.on('broadcast_session', lambda session: announced.put(session) if matches(session) else None)
+    sio.connect(args.server)
+    logging.info("Waiting for a broadcast session to be announced...")
+    try:
+        return announced.get(timeout=args.wait)
+    except queue.Empty:
+        return None
+    finally:
+        sio.disconnect()
+
+def cmd_receive(args):
+    session = wait_for_session(args)
+    if session is None:
+        sys.exit("No broadcast session was announced.")
+    os.makedirs(args.dest, exist_ok=True)
+    dest_path = os.path.join(args.dest, os.path.basename(session['file_name']))
+
+    start = time.monotonic()
+    receiver = MulticastReceiver(session, dest_path, args.interface,
+                                 idle_timeout=session['start_delay'] + args.idle_timeout)
+    missing = receiver.receive()
+    repaired = receiver.repair(f"{args.server}/download/{session['file_id']}", timeout=args.timeout) if missing else 0
+    try:
+        requests.post(f"{args.server}/broadcast/received",
+                      data={'session_id': session['session_id'], 'file_id': session['file_id']}, timeout=args.timeout)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Could not report the finished broadcast to the server: {e}")
+    elapsed = time.monotonic() - start
+    print(f"\nReceived '{dest_path}' ({session['file_size']} bytes) in {elapsed:.1f}s; "
+          f"{missing} of {receiver.total} blocks repaired over unicast ({repaired} bytes).")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Command-line client for the P2P LAN file sharing server.")
+    parser.add_argument('--server', default=os.environ.get('P2P_SERVER_URL', DEFAULT_SERVER_URL))
+    parser.add_argument('--username', default=os.environ.get('P2P_USERNAME'))
+    parser.add_argument('--password', help="Defaults to $P2P_PASSWORD or a prompt.")
+    parser.add_argument('--catalog', default=DEFAULT_CATALOG_DB, help="Path of the local catalog mirror.")
+    parser.add_argument('-j', '--jobs', type=int, default=4, help="Concurrent transfers.")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=30)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    share = sub.add_parser('share', help="Share files and directory trees.")
+    share.add_argument('paths', nargs='+')
+    share.set_defaults(func=cmd_share)
+
+    search = sub.add_parser('search', help="Search the catalog.")
+    search.add_argument('query', nargs='?', default='')
+    search.add_argument('--type', default='')
+    search.add_argument('--sort', default='', choices=['', 'popularity', 'rating', 'name'])
+    search.set_defaults(func=cmd_search)
+
+    get = sub.add_parser('get', help="Download files by id.")
+    get.add_argument('ids', nargs='+', type=int)
+    get.add_argument('--dest', default='downloads')
+    get.set_defaults(func=cmd_get)
+
+    mirror = sub.add_parser('mirror', help="Download every file matching a search.")
+    mirror.add_argument('query')
+    mirror.add_argument('--type', default='')
+    mirror.add_argument('--dest', default='downloads')
+    mirror.set_defaults(func=cmd_mirror)
+
+    broadcast = sub.add_parser('broadcast', help="Send a file to every receiver at once over multicast.")
+    broadcast.add_argument('file_id', type=int)
+    broadcast.set_defaults(func=cmd_broadcast)
+
+    receive = sub.add_parser('receive', help="Receive a multicast broadcast session.")
+    receive.add_argument('--file-id', type=int, help="Only join sessions for this file.")
+    receive.add_argument('--dest', default='downloads')
+    receive.add_argument('--interface', default='0.0.0.0', help="Local address to join the group on.")
+    receive.add_argument('--wait', type=float, default=300, help="Seconds to wait for an announcement.")
+    receive.add_argument('--idle-timeout', type=float, default=5, help="Seconds of silence that end a session.")
+    receive.set_defaults(func=cmd_receive)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.server = args.server.rstrip('/')
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,5 @@
 # server.py
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, send_file, g, has_request_context
 from flask_restful import Resource, Api
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
@@ -7,15 +7,61 @@ import sqlite3
 import bcrypt
 import os
 import logging
+import io
+import atexit
+import uuid
+import random
+import re
+import time
+from collections import OrderedDict, Counter
 from threading import Lock
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from zlib import adler32
+from log_pipeline import setup_logging
+from migrations import migrate, has_file_name_index
+from multicast import MulticastSender, BLOCK_SIZE, FEC_GROUP
+
+# Logging settings
+LOG_JSON = False  # Write one JSON object per line instead of plain text
+# Fraction of records kept for high-volume events (1.0 keeps everything)
+LOG_SAMPLE_RATES = {
+    'chat_message': 0.1,
+    'search': 0.25,
+}
+# Maximum records written per second for high-volume events
+LOG_RATE_LIMITS = {
+    'chat_message': 20,
+    'search': 20,
+    'rating': 50,
+    'download_miss': 20,
+}
+
+def current_request_id():
+    if not has_request_context():
+        return None
+    # Socket.IO events have no HTTP request id; use the client's session id instead
+    return g.get('request_id') or getattr(request, 'sid', None)
+
+# Configure logging; errors are never sampled away
+setup_logging(
+    json_output=LOG_JSON,
+    sample_rates=LOG_SAMPLE_RATES,
+    rate_limits=LOG_RATE_LIMITS,
+    get_request_id=current_request_id
+)
 
 app = Flask(__name__)
 CORS(app)
 api = Api(app)
 
+@app.before_request
+def assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+
+@app.after_request
+def return_request_id(response):
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
 # Initialize SocketIO
 socketio = SocketIO(app, cors_allowed_origins="*")
 
@@ -26,48 +72,165 @@ db_lock = Lock()
 SHARED_FILES_DIR = os.path.abspath('shared_files')
 os.makedirs(SHARED_FILES_DIR, exist_ok=True)
 
+# Hot-file cache settings
+HOT_CACHE_MAX_BYTES = 64 * 1024 * 1024      # Total memory budget for cached files
+HOT_CACHE_MAX_FILE_SIZE = 8 * 1024 * 1024   # Larger files are always streamed from disk
+HOT_CACHE_ADMIT_AFTER = 3                   # Downloads needed before a file is cached
+HOT_CACHE_POLICY = 'lru'                    # 'lru' or 'lfu'
+
+# Download counters are kept in memory and written to the database in batches
+DOWNLOAD_FLUSH_INTERVAL = 10  # seconds
+
+# Multicast broadcast sessions
+MULTICAST_GROUP = '239.255.42.42'
+MULTICAST_PORT = 5007
+MULTICAST_INTERFACE = '0.0.0.0'    # Use '127.0.0.1' to test on loopback
+MULTICAST_TTL = 1                  # Stay on the local network
+# Bytes per second. Close to gigabit line rate so a broadcast takes about as long as one
+# unicast download; lower it on 100 Mbit networks or receivers will rely on unicast repair
+MULTICAST_RATE = 100 * 1024 * 1024
+BROADCAST_START_DELAY = 3          # seconds between announcing a session and sending
+BROADCAST_RECEIPT_WINDOW = 300     # seconds after a session ends that receipts are still accepted
+
 # Initialize Database
+# Whether the trigram index on file names exists; SQLite builds without FTS5 trigram lack it
+file_name_index = False
+
 def init_db():
-    if not os.path.exists(DATABASE):
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        # Users table
-        c.execute('''
-            CREATE TABLE users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Files table
-        c.execute('''
-            CREATE TABLE files (
-                file_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_name TEXT NOT NULL,
-                file_size INTEGER,
-                file_type TEXT,
-                shared_by INTEGER,
-                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(shared_by) REFERENCES users(user_id)
-            )
-        ''')
-        # Ratings table
-        c.execute('''
-            CREATE TABLE ratings (
-                rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL CHECK(rating BETWEEN 1 AND 5),
-                rating_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(file_id) REFERENCES files(file_id),
-                FOREIGN KEY(user_id) REFERENCES users(user_id),
-                UNIQUE(file_id, user_id)
+    # Creates the database if needed and applies any pending schema migrations
+    global file_name_index
+    conn = sqlite3.connect(DATABASE)
+    version = migrate(conn)
+    file_name_index = has_file_name_index(conn)
+    conn.close()
+    logging.info(f"Database schema is at version {version}.")
+
+# Latest catalog change sequence number across files and ratings
+def current_change_seq(c):
+    c.execute("""
+        SELECT MAX(IFNULL((SELECT MAX(change_seq) FROM files), 0),
+                   IFNULL((SELECT MAX(change_seq) FROM ratings), 0))
+    """)
+    return c.fetchone()[0]
+
+# Allocate the next change sequence number; callers must hold db_lock
+def next_change_seq(c):
+    return current_change_seq(c) + 1
+
+def announce_catalog_change(seq):
+    socketio.emit('catalog_changed', {'seq': seq})
+
+# In-memory cache for small, frequently downloaded files
+class HotFileCache:
+    def __init__(self, max_bytes, max_file_size, admit_after, policy='lru'):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown cache policy: {policy}")
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.admit_after = admit_after
+        self.policy = policy
+        self.entries = OrderedDict()  # file_name -> (mtime, size, data)
+        self.hits = Counter()         # file_name -> downloads seen
+        self.size = 0
+        self.lock = Lock()
+
+    def get(self, file_name, count_hit=True):
+        """Return (mtime, size, data) for file_name, loading it if it has become popular.
+
+        Partial reads pass count_hit=False so they do not push a file towards admission.
+        """
+        file_path = os.path.join(SHARED_FILES_DIR, file_name)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.invalidate(file_name)
+            return None
+
+        with self.lock:
+            if count_hit:
+                self.hits[file_name] += 1
+            entry = self.entries.get(file_name)
+            if entry and entry[:2] == (stat.st_mtime, stat.st_size):
+                self.entries.move_to_end(file_name)
+                return entry
+            if entry:
+                # File was replaced on disk since it was cached
+                self._remove(file_name)
+            if stat.st_size > self.max_file_size or self.hits[file_name] < self.admit_after:
+                return None
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        entry = (stat.st_mtime, len(data), data)
+        with self.lock:
+            if file_name not in self.entries:
+                self._make_room(len(data))
+                if self.size + len(data) <= self.max_bytes:
+                    self.entries[file_name] = entry
+                    self.size += len(data)
+                    logging.info(f"Cached hot file '{file_name}' ({len(data)} bytes).")
+        return entry
+
+    def invalidate(self, file_name):
+        with self.lock:
+            self._remove(file_name)
+
+    def _remove(self, file_name):
+        entry = self.entries.pop(file_name, None)
+        if entry:
+            self.size -= len(entry[2])
+
+    def _make_room(self, needed):
+        while self.entries and self.size + needed > self.max_bytes:
+            if self.policy == 'lfu':
+                victim = min(self.entries, key=lambda name: self.hits[name])
+            else:
+                victim = next(iter(self.entries))
+            self._remove(victim)
+
+hot_cache = HotFileCache(HOT_CACHE_MAX_BYTES, HOT_CACHE_MAX_FILE_SIZE, HOT_CACHE_ADMIT_AFTER, HOT_CACHE_POLICY)
+
+# Pending download counts, flushed to the files table periodically
+download_counts = Counter()
+download_counts_lock = Lock()
+
+def record_download(file_id):
+    with download_counts_lock:
+        download_counts[file_id] += 1
+
+def flush_download_counts():
+    global download_counts
+    with download_counts_lock:
+        pending, download_counts = download_counts, Counter()
+    if not pending:
+        return
+    try:
+        with db_lock:
+            conn = sqlite3.connect(DATABASE)
+            c = conn.cursor()
+            # One sequence number per flush so catalog mirrors pick up the new counts
+            seq = next_change_seq(c)
+            c.executemany(
+                "UPDATE files SET download_count = download_count + ?, change_seq = ? WHERE file_id = ?",
+                [(count, seq, file_id) for file_id, count in pending.items()]
             )
-        ''')
-        conn.commit()
-        conn.close()
-        logging.info("Database initialized with users, files, and ratings tables.")
+            conn.commit()
+            conn.close()
+    except Exception as e:
+        logging.error(f"Download count flush error: {e}")
+        # Put the counts back so they are retried on the next flush
+        with download_counts_lock:
+            download_counts.update(pending)
+        return
+    announce_catalog_change(seq)
+
+def download_count_flusher():
+    while True:
+        socketio.sleep(DOWNLOAD_FLUSH_INTERVAL)
+        flush_download_counts()
+
+atexit.register(flush_download_counts)
 
 # User Registration Resource
 class Register(Resource):
@@ -152,18 +315,21 @@ class RegisterFile(Resource):
         try:
             # Save the file
             file.save(file_path)
+            hot_cache.invalidate(file_name)
             file_size = os.path.getsize(file_path)
             file_type = os.path.splitext(file_name)[1].replace('.', '')
 
             with db_lock:
                 conn = sqlite3.connect(DATABASE)
                 c = conn.cursor()
+                seq = next_change_seq(c)
                 c.execute("""
-                    INSERT INTO files (file_name, file_size, file_type, shared_by)
-                    VALUES (?, ?, ?, ?)
-                """, (file_name, file_size, file_type, user_id))
+                    INSERT INTO files (file_name, file_size, file_type, shared_by, change_seq)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (file_name, file_size, file_type, user_id, seq))
                 conn.commit()
                 conn.close()
+            announce_catalog_change(seq)
             logging.info(f"File '{file_name}' registered by user_id {user_id}.")
             return {'message': 'File registered successfully.'}, 201
         except Exception as e:
@@ -171,6 +337,29 @@ class RegisterFile(Resource):
             return {'message': 'Internal server error.'}, 500
 
 # File Download Resource
+def send_byte_ranges(file_name, ranges):
+    """Serve several byte ranges as one multipart/byteranges response; werkzeug only serves a single range."""
+    file_path = os.path.join(SHARED_FILES_DIR, file_name)
+    file_size = os.path.getsize(file_path)
+    boundary = uuid.uuid4().hex
+    parts = []
+    with open(file_path, 'rb') as f:
+        for start, stop in ranges:
+            if stop is None:
+                start, stop = (file_size + start, file_size) if start < 0 else (start, file_size)
+            start, stop = max(start, 0), min(stop, file_size)
+            if start >= stop:
+                continue
+            f.seek(start)
+            parts.append(f"--{boundary}\r\nContent-Type: application/octet-stream\r\n"
+                         f"Content-Range: bytes {start}-{stop - 1}/{file_size}\r\n\r\n".encode())
+            parts.append(f.read(stop - start))
+            parts.append(b"\r\n")
+    if not parts:
+        return Response(status=416, headers={'Content-Range': f'bytes */{file_size}'})
+    parts.append(f"--{boundary}--\r\n".encode())
+    return Response(b''.join(parts), status=206, content_type=f'multipart/byteranges; boundary={boundary}')
+
 @app.route('/download/<int:file_id>', methods=['GET'])
 def download_file(file_id):
     try:
@@ -182,41 +371,105 @@ def download_file(file_id):
             conn.close()
         if result:
             file_name = result[0]
-            return send_from_directory(SHARED_FILES_DIR, file_name, as_attachment=True)
+            # Range requests (resumes, multicast repairs) are not downloads of the whole file
+            partial = request.range is not None
+            if partial and len(request.range.ranges) > 1 and 'If-Range' not in request.headers:
+                # Multicast repair asks for many scattered blocks at once
+                return send_byte_ranges(file_name, request.range.ranges)
+            cached = hot_cache.get(file_name, count_hit=not partial)
+            if cached is not None:
+                mtime, size, data = cached
+                # Same validators send_from_directory derives from the file, so 304s and If-Range keep working
+                file_path = os.path.join(SHARED_FILES_DIR, file_name)
+                etag = f"{mtime}-{size}-{adler32(file_path.encode()) & 0xFFFFFFFF}"
+                response = send_file(io.BytesIO(data), as_attachment=True, download_name=file_name,
+                                     etag=etag, last_modified=mtime)
+            else:
+                response = send_from_directory(SHARED_FILES_DIR, file_name, as_attachment=True)
+            # A 200 carries the whole file, including a resume whose If-Range no longer matched
+            if response.status_code == 200:
+                record_download(file_id)
+            return response
         else:
-            logging.warning(f"Download attempted for non-existent file_id {file_id}.")
+            logging.warning("Download attempted for non-existent file_id %s.", file_id,
+                            extra={'event': 'download_miss', 'file_id': file_id})
             return {'message': 'File not found.'}, 404
     except Exception as e:
         logging.error(f"File download error: {e}")
         return {'message': 'Internal server error.'}, 500
 
 # Search Files Resource
+SEARCH_SORT_KEYS = {
+    'popularity': 'f.download_count DESC, f.file_id',
+    'rating': 'average_rating DESC, f.file_id',
+    'name': 'f.file_name COLLATE NOCASE, f.file_id',
+}
+
+# One row per file with its sharer and rating summary, shared by search and the change feed
+FILE_SUMMARY_SQL = """
+    SELECT f.file_id, f.file_name, f.file_size, f.file_type, u.username,
+           IFNULL(AVG(r.rating), 0) as average_rating, COUNT(r.rating) as rating_count,
+           f.download_count
+    FROM files f
+    JOIN users u ON f.shared_by = u.user_id
+    LEFT JOIN ratings r ON f.file_id = r.file_id
+"""
+
+# The trigram index can only serve patterns with three consecutive non-wildcard characters
+TRIGRAM_SEARCHABLE = re.compile(r'[^%_]{3}')
+
+def build_search_query(query, file_type, sort):
+    conditions = []
+    params = ()
+    if query and file_name_index and TRIGRAM_SEARCHABLE.search(query):
+        # Substring match on file names, served by the trigram index
+        conditions.append("f.file_id IN (SELECT rowid FROM files_name_fts WHERE file_name LIKE ?)")
+        params += ('%' + query + '%',)
+    elif query:
+        # No trigram index, or a pattern too short for it (it would scan all of it anyway); scan files directly
+        conditions.append("f.file_name LIKE ?")
+        params += ('%' + query + '%',)
+    if file_type:
+        conditions.append("f.file_type = ?")
+        params += (file_type,)
+
+    sql = FILE_SUMMARY_SQL
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " GROUP BY f.file_id"
+    if sort:
+        sql += " ORDER BY " + SEARCH_SORT_KEYS[sort]
+    return sql, params
+
+def build_changes_query(since):
+    # since=None selects every file
+    if since is None:
+        return FILE_SUMMARY_SQL + " GROUP BY f.file_id", ()
+    sql = FILE_SUMMARY_SQL + """
+        WHERE f.file_id IN (
+            SELECT file_id FROM files WHERE change_seq > ?
+            UNION
+            SELECT file_id FROM ratings WHERE change_seq > ?
+        )
+        GROUP BY f.file_id
+    """
+    return sql, (since, since)
+
 class SearchFiles(Resource):
     def get(self):
         query = request.args.get('query', '')
         file_type = request.args.get('type', '')
+        sort = request.args.get('sort', '')
+
+        if sort and sort not in SEARCH_SORT_KEYS:
+            logging.warning(f"Search with invalid sort key: {sort}")
+            return {'message': f"sort must be one of: {', '.join(SEARCH_SORT_KEYS)}."}, 400
 
         try:
             with db_lock:
                 conn = sqlite3.connect(DATABASE)
                 c = conn.cursor()
-                sql = """
-                    SELECT f.file_id, f.file_name, f.file_size, f.file_type, u.username,
-                           IFNULL(AVG(r.rating), 0) as average_rating, COUNT(r.rating) as rating_count
-                    FROM files f
-                    JOIN users u ON f.shared_by = u.user_id
-                    LEFT JOIN ratings r ON f.file_id = r.file_id
-                    WHERE f.file_name LIKE ?
-                """
-                params = ('%' + query + '%',)
-
-                if file_type:
-                    sql += " AND f.file_type = ?"
-                    params += (file_type,)
-
-                sql += " GROUP BY f.file_id"
-
-                c.execute(sql, params)
+                c.execute(*build_search_query(query, file_type, sort))
                 results = c.fetchall()
                 conn.close()
 
@@ -229,15 +482,47 @@ class SearchFiles(Resource):
                     'file_type': row[3],
                     'shared_by': row[4],
                     'average_rating': round(row[5], 2),
-                    'rating_count': row[6]
+                    'rating_count': row[6],
+                    'download_count': row[7]
                 })
 
-            logging.info(f"Search performed with query='{query}' and type='{file_type}'. Found {len(files)} files.")
+            logging.info("Search performed with query='%s' and type='%s'. Found %d files.", query, file_type, len(files),
+                         extra={'event': 'search', 'query': query, 'file_type': file_type, 'results': len(files)})
             return {'files': files}, 200
         except Exception as e:
             logging.error(f"Search error: {e}")
             return {'message': 'Internal server error.'}, 500
 
+# Catalog Change Feed Resource
+CHANGE_COLUMNS = ['file_id', 'file_name', 'file_size', 'file_type', 'shared_by',
+                  'average_rating', 'rating_count', 'download_count']
+
+class Changes(Resource):
+    def get(self):
+        since = request.args.get('since', '0')
+        try:
+            since = int(since)
+        except ValueError:
+            logging.warning(f"Invalid change sequence: {since}")
+            return {'message': 'since must be an integer.'}, 400
+
+        try:
+            with db_lock:
+                conn = sqlite3.connect(DATABASE)
+                c = conn.cursor()
+                seq = current_change_seq(c)
+                # since=0 (or a sequence from the future) means the client needs a full snapshot
+                full = since <= 0 or since > seq
+                c.execute(*build_changes_query(None if full else since))
+                results = c.fetchall()
+                conn.close()
+
+            rows = [list(row[:5]) + [round(row[5], 2)] + list(row[6:]) for row in results]
+            return {'seq': seq, 'full': full, 'columns': CHANGE_COLUMNS, 'files': rows}, 200
+        except Exception as e:
+            logging.error(f"Change feed error: {e}")
+            return {'message': 'Internal server error.'}, 500
+
 # Rate File Resource
 class RateFile(Resource):
     def post(self):
@@ -263,20 +548,125 @@ class RateFile(Resource):
             with db_lock:
                 conn = sqlite3.connect(DATABASE)
                 c = conn.cursor()
+                seq = next_change_seq(c)
                 # Insert or replace the rating
                 c.execute("""
-                    INSERT INTO ratings (file_id, user_id, rating)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(file_id, user_id) DO UPDATE SET rating=excluded.rating, rating_date=CURRENT_TIMESTAMP
-                """, (file_id, user_id, rating))
+                    INSERT INTO ratings (file_id, user_id, rating, change_seq)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(file_id, user_id) DO UPDATE SET rating=excluded.rating, rating_date=CURRENT_TIMESTAMP,
+                                                               change_seq=excluded.change_seq
+                """, (file_id, user_id, rating, seq))
                 conn.commit()
                 conn.close()
-            logging.info(f"User {user_id} rated file {file_id} with {rating} stars.")
+            announce_catalog_change(seq)
+            logging.info("User %s rated file %s with %d stars.", user_id, file_id, rating,
+                         extra={'event': 'rating', 'user_id': user_id, 'file_id': file_id, 'rating': rating})
             return {'message': 'Rating submitted successfully.'}, 201
         except Exception as e:
             logging.error(f"Rating error: {e}")
             return {'message': 'Internal server error.'}, 500
 
+# Broadcast Session Resource
+broadcast_sessions = {}
+# session_id -> {'file_id', 'expires' (None while sending), 'receivers' (addresses already counted)}
+broadcast_receipts = {}
+broadcast_lock = Lock()
+
+def prune_broadcast_receipts():
+    # Caller holds broadcast_lock
+    now = time.monotonic()
+    for session_id in [sid for sid, receipt in broadcast_receipts.items()
+                       if receipt['expires'] is not None and receipt['expires'] < now]:
+        del broadcast_receipts[session_id]
+
+def run_broadcast(session, file_path):
+    socketio.sleep(BROADCAST_START_DELAY)
+    try:
+        sender = MulticastSender(session['session_id'], file_path, session['group'], session['port'],
+                                 MULTICAST_INTERFACE, MULTICAST_TTL, MULTICAST_RATE)
+        sender.send()
+    except Exception as e:
+        logging.error(f"Broadcast session {session['session_id']} error: {e}")
+    finally:
+        with broadcast_lock:
+            broadcast_sessions.pop(session['session_id'], None)
+            # Receivers still need time to repair over unicast before reporting
+            broadcast_receipts[session['session_id']]['expires'] = time.monotonic() + BROADCAST_RECEIPT_WINDOW
+        socketio.emit('broadcast_finished', {'session_id': session['session_id']})
+
+class Broadcast(Resource):
+    def get(self):
+        with broadcast_lock:
+            sessions = list(broadcast_sessions.values())
+        return {'sessions': sessions}, 200
+
+    def post(self):
+        file_id = request.form.get('file_id')
+        if not file_id:
+            logging.warning("Broadcast attempt without file_id.")
+            return {'message': 'file_id is required.'}, 400
+
+        try:
+            with db_lock:
+                conn = sqlite3.connect(DATABASE)
+                c = conn.cursor()
+                c.execute("SELECT file_id, file_name, file_size FROM files WHERE file_id = ?", (file_id,))
+                result = c.fetchone()
+                conn.close()
+            if not result:
+                logging.warning(f"Broadcast attempted for non-existent file_id {file_id}.")
+                return {'message': 'File not found.'}, 404
+
+            file_path = os.path.join(SHARED_FILES_DIR, result[1])
+            session = {
+                'session_id': random.getrandbits(32),
+                'file_id': result[0],
+                'file_name': result[1],
+                'file_size': os.path.getsize(file_path),
+                'group': MULTICAST_GROUP,
+                'port': MULTICAST_PORT,
+                'block_size': BLOCK_SIZE,
+                'fec_group': FEC_GROUP,
+                'start_delay': BROADCAST_START_DELAY,
+            }
+            with broadcast_lock:
+                prune_broadcast_receipts()
+                broadcast_sessions[session['session_id']] = session
+                broadcast_receipts[session['session_id']] = {'file_id': session['file_id'], 'expires': None,
+                                                             'receivers': set()}
+            socketio.emit('broadcast_session', session)
+            socketio.start_background_task(run_broadcast, session, file_path)
+            logging.info(f"Broadcast session {session['session_id']} announced for file '{result[1]}'.")
+            return session, 201
+        except Exception as e:
+            logging.error(f"Broadcast error: {e}")
+            return {'message': 'Internal server error.'}, 500
+
+# Called by each receiver once it holds the whole file, so a broadcast counts one download per receiver.
+# Receivers are told apart by address: a host joins the multicast group once, however many listen on it.
+class BroadcastReceived(Resource):
+    def post(self):
+        session_id = request.form.get('session_id')
+        file_id = request.form.get('file_id')
+        try:
+            session_id = int(session_id)
+            file_id = int(file_id)
+        except (TypeError, ValueError):
+            logging.warning(f"Invalid broadcast receipt for session {session_id}, file_id {file_id}.")
+            return {'message': 'session_id and file_id must be integers.'}, 400
+
+        with broadcast_lock:
+            prune_broadcast_receipts()
+            receipt = broadcast_receipts.get(session_id)
+            if receipt is None or receipt['file_id'] != file_id:
+                logging.warning(f"Broadcast receipt for unknown session {session_id}, file_id {file_id}.")
+                return {'message': 'No such broadcast session.'}, 404
+            if request.remote_addr in receipt['receivers']:
+                return {'message': 'Receipt already recorded.'}, 200
+            receipt['receivers'].add(request.remote_addr)
+        record_download(file_id)
+        return {'message': 'Receipt recorded.'}, 201
+
 # Chat Namespace Handlers
 @socketio.on('join')
 def handle_join(data):
@@ -284,7 +674,7 @@ def handle_join(data):
     room = 'chat_room'  # Using a single chat room
     join_room(room)
     emit('message', {'user': 'System', 'msg': f'{username} has joined the chat.'}, room=room)
-    logging.info(f"User '{username}' joined the chat room.")
+    logging.info("User '%s' joined the chat room.", username, extra={'event': 'chat_join', 'username': username})
 
 @socketio.on('leave')
 def handle_leave(data):
@@ -292,7 +682,7 @@ def handle_leave(data):
     room = 'chat_room'
     leave_room(room)
     emit('message', {'user': 'System', 'msg': f'{username} has left the chat.'}, room=room)
-    logging.info(f"User '{username}' left the chat room.")
+    logging.info("User '%s' left the chat room.", username, extra={'event': 'chat_leave', 'username': username})
 
 @socketio.on('send_message')
 def handle_send_message(data):
@@ -300,7 +690,7 @@ def handle_send_message(data):
     msg = data.get('msg')
     room = 'chat_room'
     emit('message', {'user': username, 'msg': msg}, room=room)
-    logging.info(f"Message from '{username}': {msg}")
+    logging.info("Message from '%s': %s", username, msg, extra={'event': 'chat_message', 'username': username})
 
 # Add Resources to API
 api.add_resource(Register, '/register')
@@ -308,8 +698,12 @@ api.add_resource(Login, '/login')
 api.add_resource(RegisterFile, '/register_file')
 api.add_resource(SearchFiles, '/search')
 api.add_resource(RateFile, '/rate_file')
+api.add_resource(Changes, '/changes')
+api.add_resource(Broadcast, '/broadcast')
+api.add_resource(BroadcastReceived, '/broadcast/received')
 
 if __name__ == '__main__':
     init_db()
+    socketio.start_background_task(download_count_flusher)
     logging.info("Starting the server with SocketIO...")
     socketio.run(app, host='0.0.0.0', port=5000)